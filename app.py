@@ -7,12 +7,16 @@ import hashlib
 import logging
 import tempfile
 import subprocess
+import threading
+import queue
 import concurrent.futures
+from collections import Counter
 from io import BytesIO
 from flask import Flask, render_template, request, jsonify, session, send_file
 from werkzeug.utils import secure_filename
 import google.generativeai as genai
 from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
 import requests
 import shutil
 
@@ -27,6 +31,17 @@ logging.basicConfig(level=logging.INFO)
 # Thread pool for concurrent processing
 executor = concurrent.futures.ThreadPoolExecutor(max_workers=3)  # Reduced workers to save memory
 
+# Parts buffered between pipeline stages (upload -> generate -> post-process)
+PIPELINE_BUFFER_SIZE = 2
+_PIPELINE_DONE = object()
+
+# Guards read-modify-write of the page deduplication index
+page_index_lock = threading.Lock()
+
+# Size caps of the page deduplication index, oldest entries are evicted first
+MAX_CACHED_PAGES = 2000   # pages with cached text
+MAX_SEEN_PAGES = 20000    # pages seen in a single document so far
+
 # Create upload folder if it doesn't exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
@@ -160,7 +175,7 @@ def upload_file():
                     
                     if total_pages > chunk_size:
                         # Split PDF and process in parts
-                        split_files = split_pdf(file_path, total_pages, chunk_size)
+                        split_files, page_layout = split_pdf(file_path, total_pages, chunk_size)
                         
                         # Store file paths and API key
                         # Store minimal data in session to save memory
@@ -169,6 +184,8 @@ def upload_file():
                         with open(job_file, 'w') as f:
                             json.dump({
                                 'split_files': split_files,
+                                'page_layout': page_layout,
+                                'chunk_size': chunk_size,
                                 'api_key': api_key
                             }, f)
                         
@@ -295,20 +312,245 @@ def process_file_with_gemini(file_path, api_key, conversion_type):
         app.logger.error(f"Error in process_file_with_gemini: {str(e)}")
         raise
 
+def normalize_content_stream(data):
+    """Collapse whitespace runs in a content stream, leaving string operands untouched"""
+    whitespace = b' \t\r\n\f\x00'
+    normalized = bytearray()
+    i, n = 0, len(data)
+    while i < n:
+        if data[i:i+2] in (b'<<', b'>>'):
+            normalized += data[i:i+2]
+            i += 2
+        elif data[i:i+1] == b'(':
+            # Literal string, copied as is up to the balancing parenthesis
+            start, depth = i, 0
+            while i < n:
+                if data[i:i+1] == b'\\':
+                    i += 2
+                    continue
+                if data[i:i+1] == b'(':
+                    depth += 1
+                elif data[i:i+1] == b')':
+                    depth -= 1
+                    if depth == 0:
+                        i += 1
+                        break
+                i += 1
+            normalized += data[start:i]
+        elif data[i:i+1] == b'<':
+            # Hex string
+            end = data.find(b'>', i)
+            end = n if end < 0 else end + 1
+            normalized += data[i:end]
+            i = end
+        elif data[i] in whitespace:
+            while i < n and data[i] in whitespace:
+                i += 1
+            normalized += b' '
+        else:
+            normalized.append(data[i])
+            i += 1
+    return bytes(normalized).strip()
+
+def get_object_digest(obj, digests, visiting=()):
+    """Digest a PDF object with everything it references, including stream data
+
+    digests caches the digest of each indirect object of one document, so fonts
+    and images shared by many pages are only hashed once.
+    """
+    if isinstance(obj, IndirectObject):
+        key = (obj.idnum, obj.generation)
+        if key in digests:
+            return digests[key]
+        if key in visiting:
+            return b'cycle'
+        digest = get_object_digest(obj.get_object(), digests, visiting + (key,))
+        digests[key] = digest
+        return digest
+    
+    object_hash = hashlib.sha256(type(obj).__name__.encode('ascii'))
+    if isinstance(obj, DictionaryObject):
+        for name in sorted(obj.keys()):
+            # Back-references would walk the whole page tree
+            if name in ('/Parent', '/P'):
+                continue
+            object_hash.update(name.encode('utf-8'))
+            object_hash.update(get_object_digest(obj.raw_get(name), digests, visiting))
+        if isinstance(obj, StreamObject):
+            try:
+                object_hash.update(obj.get_data())
+            except Exception:
+                # Fall back to the raw (still encoded) stream data
+                object_hash.update(getattr(obj, '_data', b'') or b'')
+    elif isinstance(obj, ArrayObject):
+        for item in obj:
+            object_hash.update(get_object_digest(item, digests, visiting))
+    else:
+        object_hash.update(repr(obj).encode('utf-8'))
+    return object_hash.digest()
+
+def get_page_hash(page, digests=None):
+    """Hash a PDF page by its normalized content stream and all of its resources
+
+    Fonts are part of the hash, so pages with the same content bytes but
+    different (e.g. custom-encoded subset) fonts never share cached text.
+    """
+    digests = {} if digests is None else digests
+    page_hash = hashlib.sha256()
+    
+    contents = page.get_contents()
+    if contents is not None:
+        page_hash.update(normalize_content_stream(contents.get_data()))
+    
+    resources = page.get('/Resources')
+    if resources is not None:
+        page_hash.update(get_object_digest(resources.get_object(), digests))
+    
+    return page_hash.hexdigest()
+
+def get_page_index_path():
+    """Path of the page deduplication index shared by all jobs"""
+    return os.path.join(app.config['UPLOAD_FOLDER'], 'page_dedup_index.json')
+
+def load_page_index():
+    """Load the page deduplication index, or an empty one if it does not exist
+
+    'pages' maps a page hash to its cached text per conversion type, 'seen' maps
+    pages met in only one document so far to that document's fingerprint.
+    """
+    index_path = get_page_index_path()
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            page_index = json.load(f)
+    except (OSError, ValueError):
+        page_index = {}
+    
+    page_index['pages'] = {h: entry for h, entry in page_index.get('pages', {}).items() if entry.get('text')}
+    page_index.setdefault('seen', {})
+    page_index.setdefault('stats', {'pages_skipped': 0, 'api_calls_skipped': 0})
+    return page_index
+
+def touch_index_entry(entries, key, value, max_entries):
+    """Insert or refresh an index entry as the newest, evicting the oldest over the cap"""
+    entries.pop(key, None)
+    entries[key] = value
+    while len(entries) > max_entries:
+        del entries[next(iter(entries))]
+
+def save_page_index(page_index):
+    """Atomically write the page deduplication index"""
+    index_path = get_page_index_path()
+    tmp_path = f"{index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(page_index, f, ensure_ascii=False)
+    os.replace(tmp_path, index_path)
+
+def group_pages(page_hashes, split_out, chunk_size):
+    """Group pages into parts, giving each page in split_out its own single-page part
+
+    Returns (parts, page_layout); see split_pdf.
+    """
+    parts = []
+    page_layout = []
+    chunk = []
+    split_hashes = set()
+    
+    def flush_chunk():
+        if chunk:
+            page_layout.append({'part': len(parts), 'pages': len(chunk)})
+            parts.append(list(chunk))
+            chunk.clear()
+    
+    for page_num, page_hash in enumerate(page_hashes):
+        if page_hash not in split_out:
+            chunk.append(page_num)
+            if len(chunk) == chunk_size:
+                flush_chunk()
+            continue
+        
+        flush_chunk()
+        if page_hash in split_hashes:
+            page_layout.append({'page_hash': page_hash, 'pages': 1})
+        else:
+            split_hashes.add(page_hash)
+            page_layout.append({'part': len(parts), 'page_hash': page_hash, 'pages': 1})
+            parts.append([page_num])
+    flush_chunk()
+    
+    return parts, page_layout
+
+def count_model_calls(page_layout, cached_pages):
+    """Estimate the model calls of a layout, counting cached single-page parts as free"""
+    return sum(1 for entry in page_layout
+               if 'part' in entry and entry.get('page_hash') not in cached_pages)
+
 def split_pdf(file_path, total_pages, chunk_size=5):
-    """Split a PDF into multiple smaller PDFs with minimal memory usage"""
-    num_chunks = (total_pages + chunk_size - 1) // chunk_size
-    app.logger.info(f"Splitting PDF into {num_chunks} chunks of {chunk_size} pages")
+    """Split a PDF into multiple smaller PDFs with minimal memory usage
+
+    Pages are hashed so repeated pages (cover, instructions, answer sheets) are
+    only sent once. A page is split into its own single-page part, so its text
+    can be cached, only when that does not add model calls. Candidates are tried
+    in order (pages with cached text, pages repeating within this PDF, pages seen
+    in another document) and kept only if the estimated call count, starting
+    from the plain ceil(total_pages / chunk_size) chunks, does not grow. Later
+    occurrences of a split-out page are not split at all.
+
+    Returns (split_files, page_layout). page_layout lists the result segments in
+    page order: {'part': i} for a regular part, {'part': i, 'page_hash': h} for a
+    single-page part whose text is cached, and {'page_hash': h} for a repeated
+    page whose text is spliced in from the cache. Every entry also records its
+    number of 'pages'.
+    """
+    app.logger.info(f"Splitting PDF into chunks of up to {chunk_size} pages")
     
     base_name = os.path.splitext(file_path)[0]
     split_files = []
     
     try:
-        for i in range(num_chunks):
-            start_page = i * chunk_size
-            end_page = min((i + 1) * chunk_size, total_pages)
+        with open(file_path, 'rb') as input_file:
+            pdf = PdfReader(input_file)
+            digests = {}
+            page_hashes = [get_page_hash(pdf.pages[page_num], digests) for page_num in range(total_pages)]
+            del digests
+        gc.collect()
+        
+        # Fingerprint of the whole document, to tell re-uploads from other documents
+        document_hash = hashlib.sha256(''.join(page_hashes).encode('ascii')).hexdigest()
+        
+        with page_index_lock:
+            page_index = load_page_index()
+            cached_pages = page_index['pages']
+            seen_pages = page_index['seen']
             
-            # Create a new PDF with just the pages in this chunk
+            hash_counts = Counter(page_hashes)
+            other_documents = {h for h in page_hashes if seen_pages.get(h, document_hash) != document_hash}
+            for page_hash in page_hashes:
+                if page_hash not in cached_pages:
+                    touch_index_entry(seen_pages, page_hash, seen_pages.get(page_hash, document_hash), MAX_SEEN_PAGES)
+            save_page_index(page_index)
+        
+        # Split out repeated pages one by one, as long as it does not cost extra model calls
+        baseline_calls = (total_pages + chunk_size - 1) // chunk_size
+        split_out = set()
+        calls = baseline_calls
+        candidates = ([h for h in dict.fromkeys(page_hashes) if h in cached_pages]
+                      + [h for h in dict.fromkeys(page_hashes) if hash_counts[h] > 1 and h not in cached_pages]
+                      + [h for h in dict.fromkeys(page_hashes)
+                         if h in other_documents and hash_counts[h] == 1 and h not in cached_pages])
+        for page_hash in candidates:
+            _, page_layout = group_pages(page_hashes, split_out | {page_hash}, chunk_size)
+            new_calls = count_model_calls(page_layout, cached_pages)
+            if new_calls <= calls:
+                split_out.add(page_hash)
+                calls = new_calls
+        
+        parts, page_layout = group_pages(page_hashes, split_out, chunk_size)
+        skipped_pages = sum(1 for entry in page_layout if 'part' not in entry)
+        
+        app.logger.info(f"Split {total_pages} pages into {len(parts)} parts, {skipped_pages} repeated pages not split")
+        
+        for i, part_pages in enumerate(parts):
+            # Create a new PDF with just the pages in this part
             output = PdfWriter()
             
             # Use context manager to ensure resources are released
@@ -316,7 +558,7 @@ def split_pdf(file_path, total_pages, chunk_size=5):
                 pdf = PdfReader(input_file)
                 
                 # Only load the pages we need
-                for page_num in range(start_page, end_page):
+                for page_num in part_pages:
                     output.add_page(pdf.pages[page_num])
                 
                 # Write the output file
@@ -332,7 +574,7 @@ def split_pdf(file_path, total_pages, chunk_size=5):
         # Clean up the original file to save space
         os.remove(file_path)
         
-        return split_files
+        return split_files, page_layout
     except Exception as e:
         app.logger.error(f"Error splitting PDF: {str(e)}")
         # Clean up partial files on error
@@ -377,7 +619,9 @@ def convert_file():
             api_key,
             get_prompt(conversion_type), 
             conversion_type,
-            job_id
+            job_id,
+            job_data.get('page_layout'),
+            job_data.get('chunk_size', 5)
         )
         
         # Store the job ID and return it for status checking
@@ -391,9 +635,82 @@ def convert_file():
         app.logger.error(f"Error starting conversion: {str(e)}")
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
 
-def process_split_files(split_files, api_key, prompt, conversion_type, job_id):
-    """Process multiple PDF parts and combine the results with memory optimization"""
+def call_with_rate_limit_retry(func, *args, max_retries=3, **kwargs):
+    """Call a Gemini API function, waiting and retrying on rate limit errors"""
+    for attempt in range(max_retries):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if "429" in str(e) and attempt < max_retries - 1:
+                # Rate limit error, wait and retry
+                app.logger.warning(f"Rate limit hit, waiting before retry: {str(e)}")
+                time.sleep(60)  # Wait 60 seconds before retry
+            else:
+                raise
+
+def put_unless_stopped(outbox, entry, stop):
+    """Put entry on a bounded queue, giving up once stop is set"""
+    while not stop.is_set():
+        try:
+            outbox.put(entry, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def get_unless_stopped(inbox, stop):
+    """Get the next entry from a queue, or _PIPELINE_DONE once stop is set"""
+    while not stop.is_set():
+        try:
+            return inbox.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _PIPELINE_DONE
+
+def run_pipeline_stage(name, work, inbox, outbox, stop):
+    """Apply work to each (index, item) from inbox and pass the result to outbox.
+
+    Items that already failed in an earlier stage are forwarded unchanged so
+    the final stage can report the error for that part. The stage exits as soon
+    as stop is set, even while waiting on a full or empty queue.
+    """
+    while True:
+        entry = get_unless_stopped(inbox, stop)
+        if entry is _PIPELINE_DONE:
+            put_unless_stopped(outbox, _PIPELINE_DONE, stop)
+            return
+
+        index, item = entry
+        if not isinstance(item, Exception):
+            try:
+                item = work(index, item)
+            except Exception as e:
+                app.logger.error(f"Error in {name} stage for part {index+1}: {str(e)}")
+                item = e
+        if not put_unless_stopped(outbox, (index, item), stop):
+            return
+
+def process_split_files(split_files, api_key, prompt, conversion_type, job_id, page_layout=None, chunk_size=5):
+    """Process multiple PDF parts and combine the results with memory optimization
+
+    Parts flow through a pipeline of threads connected by small bounded queues,
+    so part N+1 is uploaded while part N is being generated and the post-processing
+    of earlier parts runs in this thread at the same time.
+
+    When a page_layout from split_pdf is given, single-page parts already in the
+    page deduplication index are not sent to the model, and the cached text is
+    spliced back in at every occurrence of the page. API calls skipped are
+    counted against plain chunks of chunk_size pages.
+    """
     results = {}
+    if page_layout:
+        total_pages = sum(entry.get('pages', 1) for entry in page_layout)
+        baseline_calls = (total_pages + chunk_size - 1) // chunk_size
+    else:
+        page_layout = [{'part': i} for i in range(len(split_files))]
+        baseline_calls = len(split_files)
+    part_hashes = {entry['part']: entry['page_hash'] for entry in page_layout
+                   if 'part' in entry and 'page_hash' in entry}
     status_file = os.path.join(app.config['UPLOAD_FOLDER'], f"job_{job_id}_status.json")
     
     # Initialize status file
@@ -405,6 +722,23 @@ def process_split_files(split_files, api_key, prompt, conversion_type, job_id):
         }, f)
     
     try:
+        # Take the text of repeated pages from the dedup index when available
+        with page_index_lock:
+            cached_pages = load_page_index()['pages']
+        page_texts = {}
+        for page_hash in set(entry['page_hash'] for entry in page_layout if 'page_hash' in entry):
+            cached_text = cached_pages.get(page_hash, {}).get('text', {}).get(conversion_type)
+            if cached_text is not None:
+                page_texts[page_hash] = cached_text
+        
+        cached_parts = [i for i, page_hash in part_hashes.items() if page_hash in page_texts]
+        for i in cached_parts:
+            results[i] = page_texts[part_hashes[i]]
+            if os.path.exists(split_files[i]):
+                os.remove(split_files[i])
+        if cached_parts:
+            app.logger.info(f"Skipping {len(cached_parts)} parts already in the page dedup index")
+        
         # Configure the Gemini API
         genai.configure(api_key=api_key)
         
@@ -416,67 +750,124 @@ def process_split_files(split_files, api_key, prompt, conversion_type, job_id):
             "top_k": 40,
             "max_output_tokens": 32768,  # Reduced to save memory
         }
+        model = genai.GenerativeModel(model_name=model_name, generation_config=generation_config)
         
-        # Process each file sequentially
-        for i, file_path in enumerate(split_files):
-            try:
-                app.logger.info(f"Processing part {i+1}/{len(split_files)}: {file_path}")
+        def upload_part(index, file_path):
+            app.logger.info(f"Uploading part {index+1}/{len(split_files)}: {file_path}")
+            return call_with_rate_limit_retry(
+                genai.upload_file, path=file_path, display_name=os.path.basename(file_path)
+            )
+        
+        def generate_part(index, uploaded_file):
+            app.logger.info(f"Generating part {index+1}/{len(split_files)}")
+            response = call_with_rate_limit_retry(model.generate_content, [uploaded_file, prompt])
+            text = response.text
+            
+            # Clear references to large objects
+            del response
+            del uploaded_file
+            return text
+        
+        # Bounded queues between stages keep only a few parts in flight
+        upload_queue = queue.Queue(maxsize=PIPELINE_BUFFER_SIZE)
+        generate_queue = queue.Queue(maxsize=PIPELINE_BUFFER_SIZE)
+        post_process_queue = queue.Queue(maxsize=PIPELINE_BUFFER_SIZE)
+        
+        # Set when the pipeline finishes or post-processing fails, so no stage stays blocked
+        stop = threading.Event()
+        
+        def feed_parts():
+            for index, file_path in enumerate(split_files):
+                if index not in results:
+                    if not put_unless_stopped(upload_queue, (index, file_path), stop):
+                        return
+            put_unless_stopped(upload_queue, _PIPELINE_DONE, stop)
+        
+        stages = [
+            threading.Thread(target=feed_parts, daemon=True),
+            threading.Thread(target=run_pipeline_stage, args=('upload', upload_part, upload_queue, generate_queue, stop), daemon=True),
+            threading.Thread(target=run_pipeline_stage, args=('generate', generate_part, generate_queue, post_process_queue, stop), daemon=True),
+        ]
+        for stage in stages:
+            stage.start()
+        
+        try:
+            # Post-process parts as they come out of the pipeline
+            completed = len(cached_parts)
+            failed_parts = 0
+            while True:
+                entry = get_unless_stopped(post_process_queue, stop)
+                if entry is _PIPELINE_DONE:
+                    break
                 
-                max_retries = 3
-                for attempt in range(max_retries):
-                    try:
-                        # Process each file individually to control memory usage
-                        model = genai.GenerativeModel(model_name=model_name, generation_config=generation_config)
-                        
-                        # Upload and process file
-                        with open(file_path, 'rb') as f:
-                            uploaded_file = genai.upload_file(path=file_path, display_name=os.path.basename(file_path))
-                            response = model.generate_content([uploaded_file, prompt])
-                            results[i] = response.text
-                            
-                            # Clear references to large objects
-                            del response
-                            del uploaded_file
-                            gc.collect()
-                            
-                            break
-                    except Exception as e:
-                        if "429" in str(e) and attempt < max_retries - 1:
-                            # Rate limit error, wait and retry
-                            app.logger.warning(f"Rate limit hit, waiting before retry: {str(e)}")
-                            time.sleep(60)  # Wait 60 seconds before retry
-                        else:
-                            raise e
+                i, text = entry
+                if isinstance(text, Exception):
+                    results[i] = f"Error processing part {i+1}: {str(text)}"
+                    failed_parts += 1
+                else:
+                    results[i] = process_formulas(text)
+                    if i in part_hashes:
+                        page_texts[part_hashes[i]] = results[i]
                 
                 # Clean up this file immediately to save space
+                file_path = split_files[i]
                 if os.path.exists(file_path):
                     os.remove(file_path)
                 
                 # Update status file
+                completed += 1
                 with open(status_file, 'r') as f:
                     status = json.load(f)
                 
-                status['completed'] = i + 1
+                status['completed'] = completed
                 
                 with open(status_file, 'w') as f:
                     json.dump(status, f)
                 
                 # Force garbage collection after each file
                 gc.collect()
-                
-            except Exception as e:
-                app.logger.error(f"Error processing part {i+1}: {str(e)}")
-                results[i] = f"Error processing part {i+1}: {str(e)}"
-                
-                # Clean up this file if it exists
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+        finally:
+            stop.set()
+            
+            # Drop buffered parts so uploaded files are released, then wait for the stages
+            for pipeline_queue in (upload_queue, generate_queue, post_process_queue):
+                while True:
+                    try:
+                        pipeline_queue.get_nowait()
+                    except queue.Empty:
+                        break
+            for stage in stages:
+                stage.join()
         
-        # Combine results
-        combined_text = "\n\n--- End of Part ---\n\n".join([results.get(i, f"Error processing part {i+1}") for i in range(len(split_files))])
+        # Pages not sent to the model, and calls saved compared to plain chunks
+        repeated_pages = sum(1 for entry in page_layout if 'part' not in entry)
+        pages_skipped = repeated_pages + len(cached_parts)
+        api_calls_skipped = baseline_calls - (len(split_files) - len(cached_parts))
         
-        # Process formulas
-        combined_text = process_formulas(combined_text)
+        # Store the text of repeated pages for later jobs and count what this job skipped
+        used_page_hashes = set(part_hashes.values())
+        with page_index_lock:
+            page_index = load_page_index()
+            for page_hash in used_page_hashes:
+                if page_hash not in page_texts:
+                    continue
+                entry = page_index['pages'].get(page_hash, {'text': {}})
+                entry['text'][conversion_type] = page_texts[page_hash]
+                touch_index_entry(page_index['pages'], page_hash, entry, MAX_CACHED_PAGES)
+                page_index['seen'].pop(page_hash, None)
+            page_index['stats']['pages_skipped'] += pages_skipped
+            page_index['stats']['api_calls_skipped'] += api_calls_skipped
+            save_page_index(page_index)
+        
+        # Combine results in page order (formulas were already processed per part)
+        segments = []
+        for entry in page_layout:
+            if 'part' in entry:
+                i = entry['part']
+                segments.append(results.get(i, f"Error processing part {i+1}"))
+            else:
+                segments.append(page_texts.get(entry['page_hash'], "Error processing repeated page"))
+        combined_text = "\n\n--- End of Part ---\n\n".join(segments)
         
         # Save the final result to a file
         timestamp = int(time.time())
@@ -491,7 +882,10 @@ def process_split_files(split_files, api_key, prompt, conversion_type, job_id):
                 'status': 'completed',
                 'completed': len(split_files),
                 'total': len(split_files),
-                'result_path': result_path
+                'result_path': result_path,
+                'pages_skipped': pages_skipped,
+                'api_calls_skipped': api_calls_skipped,
+                'failed_parts': failed_parts
             }, f)
         
         return combined_text
@@ -547,7 +941,9 @@ def check_conversion_status():
                 'status': 'completed',
                 'result': result_text,
                 'completed': status.get('completed', 0),
-                'total': status.get('total', 0)
+                'total': status.get('total', 0),
+                'pages_skipped': status.get('pages_skipped', 0),
+                'api_calls_skipped': status.get('api_calls_skipped', 0)
             })
         elif status.get('status') == 'error':
             return jsonify({
@@ -566,6 +962,24 @@ def check_conversion_status():
         app.logger.error(f"Error checking conversion status: {str(e)}")
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
 
+@app.route('/api/dedup-stats', methods=['GET'])
+def dedup_stats():
+    """Report how many pages and API calls the page deduplication index has saved"""
+    try:
+        with page_index_lock:
+            page_index = load_page_index()
+        
+        return jsonify({
+            'success': True,
+            'indexed_pages': len(page_index['pages']),
+            'tracked_pages': len(page_index['seen']),
+            'pages_skipped': page_index['stats']['pages_skipped'],
+            'api_calls_skipped': page_index['stats']['api_calls_skipped']
+        })
+    except Exception as e:
+        app.logger.error(f"Error reading dedup stats: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
 @app.route('/convert-to-word', methods=['POST'])
 def convert_to_word():
     """Convert text to a Word document using pandoc"""
@@ -576,33 +990,16 @@ def convert_to_word():
         return jsonify({'success': False, 'message': 'No content provided'}), 400
     
     try:
-        # Create temporary files with context managers to ensure cleanup
-        with tempfile.NamedTemporaryFile(suffix='.md', delete=False) as md_file:
-            md_path = md_file.name
-            content = content.replace('\n', '\n\n')
-            md_file.write(content.encode('utf-8'))
-        
         with tempfile.NamedTemporaryFile(suffix='.docx', delete=False) as docx_file:
             docx_path = docx_file.name
         
-        # Run pandoc with minimal options
-        pandoc_command = [
-            "pandoc",
-            md_path,
-            "-o", docx_path,
-            "--from", "markdown",
-            "--to", "docx",
-            "--mathml"
-        ]
-        
-        subprocess.run(pandoc_command, check=True, timeout=60)  # Add timeout to prevent hanging
+        export_docx(content, docx_path)
         
         # Read the docx file and return it
         with open(docx_path, 'rb') as f:
             docx_data = f.read()
         
-        # Clean up temporary files immediately
-        os.unlink(md_path)
+        # Clean up temporary file immediately
         os.unlink(docx_path)
         
         # Return the file as an attachment
@@ -615,10 +1012,8 @@ def convert_to_word():
     except Exception as e:
         app.logger.error(f"Error converting to Word: {str(e)}")
         
-        # Clean up temp files if they exist
+        # Clean up temp file if it exists
         try:
-            if 'md_path' in locals() and os.path.exists(md_path):
-                os.unlink(md_path)
             if 'docx_path' in locals() and os.path.exists(docx_path):
                 os.unlink(docx_path)
         except:
@@ -626,6 +1021,29 @@ def convert_to_word():
             
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
 
+def export_docx(content, docx_path):
+    """Write text as a Word document to docx_path using pandoc"""
+    # Create temporary file with context manager to ensure cleanup
+    with tempfile.NamedTemporaryFile(suffix='.md', delete=False) as md_file:
+        md_path = md_file.name
+        content = content.replace('\n', '\n\n')
+        md_file.write(content.encode('utf-8'))
+    
+    try:
+        # Run pandoc with minimal options
+        pandoc_command = [
+            "pandoc",
+            md_path,
+            "-o", docx_path,
+            "--from", "markdown",
+            "--to", "docx",
+            "--mathml"
+        ]
+        
+        subprocess.run(pandoc_command, check=True, timeout=60)  # Add timeout to prevent hanging
+    finally:
+        os.unlink(md_path)
+
 def get_prompt(conversion_type):
     """Get the appropriate prompt based on conversion type"""
     if conversion_type == 'latex_mcq':
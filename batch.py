@@ -0,0 +1,405 @@
+"""Headless batch conversion of a folder of PDF/image files.
+
+Usage:
+    python batch.py INPUT_DIR OUTPUT_DIR --api-key KEY --hardware-id ID [options]
+
+Splitting and DOCX export run in a process pool, model calls run in a thread
+pool with configurable concurrency. Formula post-processing stays in the model
+threads, inside process_split_files/process_file_with_gemini: it is a few regex
+passes over the text, cheaper than shipping the text to another process.
+Results are written next to a manifest.json in OUTPUT_DIR as each file
+finishes, so an interrupted batch (including Ctrl-C) resumes where it stopped
+when run again.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import shutil
+import hashlib
+import argparse
+import threading
+import concurrent.futures
+from multiprocessing.managers import SyncManager
+
+from PyPDF2 import PdfReader
+
+import app as pconvert
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png')
+MANIFEST_NAME = 'manifest.json'
+
+
+class BatchInterrupted(Exception):
+    """Raised for files that had not reached the model when the batch was interrupted"""
+
+
+def ignore_sigint():
+    """Leave Ctrl-C to the main process, which stops the batch cleanly"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def init_worker(page_index_lock, work_dir):
+    """Share the page index lock and work folder with a pool process"""
+    ignore_sigint()
+    pconvert.page_index_lock = page_index_lock
+    pconvert.app.config['UPLOAD_FOLDER'] = work_dir
+
+
+def find_input_files(input_dir):
+    """List supported files under input_dir as sorted relative paths"""
+    found = []
+    for root, _, files in os.walk(input_dir):
+        for name in files:
+            if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                found.append(os.path.relpath(os.path.join(root, name), input_dir))
+    return sorted(found)
+
+
+def get_job_id(rel_path):
+    """Stable job ID for a file so work files of different inputs never collide"""
+    return "batch_" + hashlib.md5(rel_path.encode('utf-8')).hexdigest()[:12]
+
+
+def prepare_file(src_path, work_dir, job_id, chunk_size):
+    """Copy an input into the work folder and split it if it is a large PDF (runs in the process pool)"""
+    ext = os.path.splitext(src_path)[1].lower()
+    work_path = os.path.join(work_dir, f"{job_id}{ext}")
+    shutil.copyfile(src_path, work_path)
+
+    try:
+        if ext != '.pdf':
+            return {'path': work_path, 'pages': 1}
+
+        with open(work_path, 'rb') as f:
+            total_pages = len(PdfReader(f).pages)
+
+        if total_pages <= chunk_size:
+            return {'path': work_path, 'pages': total_pages}
+
+        split_files, page_layout = pconvert.split_pdf(work_path, total_pages, chunk_size)
+        return {'split_files': split_files, 'page_layout': page_layout, 'pages': total_pages}
+    except Exception:
+        # split_pdf removes the copy on success only
+        if os.path.exists(work_path):
+            os.remove(work_path)
+        raise
+
+
+def export_docx_file(txt_path, docx_path):
+    """Export a converted text file to DOCX (runs in the process pool)"""
+    with open(txt_path, 'r', encoding='utf-8') as f:
+        pconvert.export_docx(f.read(), docx_path)
+
+
+def get_output_base(rel_path, args):
+    """Output path without suffix, keeping the source extension and the conversion type
+
+    test.pdf and test.png, or a text and a latex_mcq run, never overwrite each other.
+    """
+    return os.path.join(args.output_dir, f"{rel_path}.{args.type}")
+
+
+def export_entry_docx(entry, process_pool, args):
+    """Export the DOCX of a converted entry, recording a failure in 'docx_error'
+
+    The text result is kept as done either way, so a resume only retries the export.
+    """
+    entry = dict(entry)
+    entry.pop('docx', None)
+    entry.pop('docx_error', None)
+    txt_path = os.path.join(args.output_dir, entry['txt'])
+    docx_path = os.path.splitext(txt_path)[0] + '.docx'
+    try:
+        process_pool.submit(export_docx_file, txt_path, docx_path).result()
+        entry['docx'] = os.path.relpath(docx_path, args.output_dir)
+    except Exception as e:
+        entry['docx_error'] = str(e)
+    return entry
+
+
+def export_only(entry, process_pool, stop, args):
+    """Retry the DOCX export of a file whose text was already converted"""
+    if stop.is_set():
+        raise BatchInterrupted()
+    started = time.time()
+    entry = export_entry_docx(entry, process_pool, args)
+    entry['seconds'] = round(time.time() - started, 2)
+    return entry
+
+
+def convert_file(rel_path, process_pool, model_slots, stop, args):
+    """Prepare an input, run the model on it and write its outputs
+
+    Runs in a thread pool twice the size of model_slots, so the next files are
+    split while others wait for the model, without copying the whole folder.
+    Once stop is set, files that have not reached the model are dropped.
+    """
+    started = time.time()
+    job_id = get_job_id(rel_path)
+    if stop.is_set():
+        raise BatchInterrupted()
+    prepared = process_pool.submit(
+        prepare_file,
+        os.path.join(args.input_dir, rel_path),
+        args.work_dir,
+        job_id,
+        args.chunk_size
+    ).result()
+
+    with model_slots:
+        if stop.is_set():
+            for path in prepared.get('split_files', [prepared.get('path')]):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise BatchInterrupted()
+        result, parts, api_calls_skipped = run_model(prepared, job_id, args)
+
+    base_path = get_output_base(rel_path, args)
+    os.makedirs(os.path.dirname(base_path), exist_ok=True)
+    txt_path = base_path + '.txt'
+    with open(txt_path, 'w', encoding='utf-8') as f:
+        f.write(result)
+
+    entry = {
+        'status': 'done',
+        'type': args.type,
+        'txt': os.path.relpath(txt_path, args.output_dir),
+        'pages': prepared['pages'],
+        'parts': parts,
+        'api_calls_skipped': api_calls_skipped
+    }
+
+    if not args.no_docx:
+        entry = export_entry_docx(entry, process_pool, args)
+
+    entry['seconds'] = round(time.time() - started, 2)
+    return entry
+
+
+def run_model(prepared, job_id, args):
+    """Convert a prepared input with Gemini, returning (text, parts, api_calls_skipped)"""
+    if 'split_files' in prepared:
+        result = pconvert.process_split_files(
+            prepared['split_files'],
+            args.api_key,
+            pconvert.get_prompt(args.type),
+            args.type,
+            job_id,
+            prepared['page_layout'],
+            args.chunk_size
+        )
+
+        # Drop the web job files, the batch keeps its own outputs
+        status_file = os.path.join(args.work_dir, f"job_{job_id}_status.json")
+        with open(status_file, 'r') as f:
+            status = json.load(f)
+        for path in (status.get('result_path'), status_file):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+        # A failed part leaves an error message in the text, retry the whole file on resume
+        if status.get('failed_parts'):
+            raise RuntimeError(f"{status['failed_parts']} of {status.get('total', 0)} parts failed")
+        return result, status.get('total', 0), status.get('api_calls_skipped', 0)
+
+    try:
+        result = pconvert.process_file_with_gemini(prepared['path'], args.api_key, args.type)
+    finally:
+        if os.path.exists(prepared['path']):
+            os.remove(prepared['path'])
+    return result, 1, 0
+
+
+def load_manifest(manifest_path):
+    """Load the manifest of a previous run, or an empty one"""
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'files': {}}
+
+
+def save_manifest(manifest, manifest_path):
+    """Atomically write the manifest so an interrupted run never leaves it truncated"""
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def get_manifest_entry(manifest, rel_path, conversion_type):
+    """Manifest entry of a file for one conversion type, or None"""
+    entries = manifest['files'].get(rel_path)
+    # Entries are kept per conversion type; older flat entries do not count
+    if not entries or 'status' in entries:
+        return None
+    return entries.get(conversion_type)
+
+
+def get_resume_step(entry, args):
+    """What is left to do for a file: None when finished, 'docx' or 'convert'"""
+    if not entry or entry.get('status') != 'done' or entry.get('type') != args.type:
+        return 'convert'
+    if not os.path.exists(os.path.join(args.output_dir, entry['txt'])):
+        return 'convert'
+    if args.no_docx:
+        return None
+    docx = entry.get('docx')
+    if not docx or not os.path.exists(os.path.join(args.output_dir, docx)):
+        return 'docx'
+    return None
+
+
+def run_batch(args):
+    """Convert every supported file under args.input_dir, returning the number of failures
+
+    Failed DOCX exports count as failures too, but their text stays recorded as done.
+    """
+    os.makedirs(args.output_dir, exist_ok=True)
+    os.makedirs(args.work_dir, exist_ok=True)
+    pconvert.app.config['UPLOAD_FOLDER'] = args.work_dir
+
+    manifest_path = os.path.join(args.output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+
+    input_files = find_input_files(args.input_dir)
+    steps = {rel: get_resume_step(get_manifest_entry(manifest, rel, args.type), args) for rel in input_files}
+    pending = [rel for rel in input_files if steps[rel]]
+    exports = sum(1 for rel in pending if steps[rel] == 'docx')
+    print(f"Found {len(input_files)} files, {len(input_files) - len(pending)} already converted, "
+          f"{len(pending) - exports} to convert, {exports} to export to DOCX")
+
+    started = time.time()
+    done, exported, failed, docx_failed, pages = 0, 0, 0, 0, 0
+    interrupted = False
+
+    # One lock guards the page dedup index across pool processes and threads
+    manager = SyncManager()
+    manager.start(ignore_sigint)
+    page_index_lock = manager.Lock()
+    pconvert.page_index_lock = page_index_lock
+
+    # Twice as many file threads as model slots lets splitting run a little ahead
+    model_slots = threading.Semaphore(args.concurrency)
+    stop = threading.Event()
+
+    with manager, concurrent.futures.ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=init_worker,
+        initargs=(page_index_lock, args.work_dir)
+    ) as process_pool, concurrent.futures.ThreadPoolExecutor(max_workers=2 * args.concurrency) as model_pool:
+        futures = {}
+        for rel in pending:
+            if steps[rel] == 'docx':
+                entry = get_manifest_entry(manifest, rel, args.type)
+                future = model_pool.submit(export_only, entry, process_pool, stop, args)
+            else:
+                future = model_pool.submit(convert_file, rel, process_pool, model_slots, stop, args)
+            futures[future] = rel
+
+        def record(future):
+            nonlocal done, exported, failed, docx_failed, pages
+            rel = futures[future]
+            if future.cancelled() or isinstance(future.exception(), BatchInterrupted):
+                return
+            progress = f"[{done + exported + failed + 1}/{len(pending)}] {rel}"
+            try:
+                entry = future.result()
+            except Exception as e:
+                entry = {'status': 'error', 'type': args.type, 'error': str(e)}
+
+            if entry['status'] == 'error':
+                failed += 1
+                print(f"{progress}: error: {entry['error']}", file=sys.stderr)
+            elif steps[rel] == 'docx':
+                exported += 1
+                if 'docx_error' not in entry:
+                    print(f"{progress}: DOCX exported in {entry['seconds']}s")
+            else:
+                done += 1
+                pages += entry['pages']
+                print(f"{progress}: {entry['pages']} pages in {entry['seconds']}s")
+            if 'docx_error' in entry:
+                docx_failed += 1
+                print(f"{progress}: DOCX export failed: {entry['docx_error']}", file=sys.stderr)
+
+            entries = manifest['files'].get(rel)
+            if not entries or 'status' in entries:
+                entries = manifest['files'][rel] = {}
+            entries[args.type] = entry
+            save_manifest(manifest, manifest_path)
+
+        recorded = set()
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                record(future)
+                recorded.add(future)
+        except KeyboardInterrupt:
+            interrupted = True
+            print("Interrupted, waiting for the files already sent to the model to finish", file=sys.stderr)
+            stop.set()
+            model_pool.shutdown(wait=False, cancel_futures=True)
+
+            # Cancelled futures never complete for as_completed, only wait on the ones still running.
+            # Files already sent to the model still write their outputs, keep them in the manifest
+            running = [future for future in futures if not future.cancelled() and future not in recorded]
+            for future in concurrent.futures.as_completed(running):
+                record(future)
+
+    elapsed = time.time() - started
+    minutes = max(elapsed, 1e-9) / 60
+    dedup_stats = pconvert.load_page_index()['stats']
+
+    print(f"Converted {done} files ({pages} pages), {failed} failed, {exported} DOCX exports retried, "
+          f"{docx_failed} DOCX exports failed, in {elapsed:.1f}s")
+    print(f"Throughput: {done / minutes:.1f} files/min, {pages / minutes:.1f} pages/min")
+    print(f"Page dedup index: {dedup_stats['pages_skipped']} pages and {dedup_stats['api_calls_skipped']} API calls skipped in total")
+
+    if interrupted:
+        raise KeyboardInterrupt
+    return failed + docx_failed
+
+
+def positive_int(value):
+    """argparse type for options that must be at least 1"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch convert a folder of PDF/image files with Gemini")
+    parser.add_argument('input_dir', help="Folder to scan for .pdf, .jpg, .jpeg and .png files")
+    parser.add_argument('output_dir', help="Folder for the converted files and manifest.json")
+    parser.add_argument('--api-key', default=os.environ.get('GEMINI_API_KEY'),
+                        help="Google Generative AI API key (default: $GEMINI_API_KEY)")
+    parser.add_argument('--hardware-id', default=os.environ.get('PCONVERT_HARDWARE_ID'),
+                        help="Activated hardware ID (default: $PCONVERT_HARDWARE_ID)")
+    parser.add_argument('--type', choices=['text', 'latex_mcq'], default='text', help="Conversion type")
+    parser.add_argument('--concurrency', type=positive_int, default=3, help="Files sent to the model at the same time")
+    parser.add_argument('--workers', type=positive_int, default=os.cpu_count(), help="Processes for splitting and DOCX export")
+    parser.add_argument('--chunk-size', type=positive_int, default=5, help="Pages per part when splitting PDFs")
+    parser.add_argument('--work-dir', default=pconvert.app.config['UPLOAD_FOLDER'],
+                        help="Folder for intermediate files and the page dedup index")
+    parser.add_argument('--no-docx', action='store_true', help="Skip the pandoc DOCX export")
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error("an API key is required (--api-key or $GEMINI_API_KEY)")
+    if not args.hardware_id or not pconvert.check_activation(args.hardware_id):
+        parser.error("Phần mềm chưa được kích hoạt hoặc Hardware ID không hợp lệ.")
+
+    try:
+        return 1 if run_batch(args) else 0
+    except KeyboardInterrupt:
+        return 130
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Benchmark the pipelined process_split_files against serial upload/generate.
+
+Usage:
+    python scripts/bench_pipeline.py [--parts 20] [--upload 0.15] [--generate 0.25]
+
+Runs against the local fake backend in fake_genai.py. The pipelined run is
+submitted to a single-worker executor to show it needs no extra job
+concurrency.
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import concurrent.futures
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_genai
+
+fake_genai.install()
+
+import app as pconvert
+
+
+def make_parts(folder, count):
+    """Create placeholder part files like split_pdf would"""
+    parts = []
+    for i in range(count):
+        path = os.path.join(folder, f"bench_part{i+1}.pdf")
+        with open(path, 'wb') as f:
+            f.write(b'%PDF-1.4\n')
+        parts.append(path)
+    return parts
+
+
+def run_serial(split_files, prompt):
+    """Upload and generate each part back to back, as before the pipeline"""
+    model = fake_genai.GenerativeModel(model_name='fake')
+    results = []
+    for file_path in split_files:
+        uploaded_file = fake_genai.upload_file(path=file_path, display_name=os.path.basename(file_path))
+        results.append(pconvert.process_formulas(model.generate_content([uploaded_file, prompt]).text))
+    return "\n\n--- End of Part ---\n\n".join(results)
+
+
+def run_pipelined(split_files, prompt, job_id):
+    """Run process_split_files on a single-worker executor"""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(pconvert.process_split_files, split_files, 'fake-key', prompt, 'text', job_id).result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the upload/generate pipeline on the fake backend")
+    parser.add_argument('--parts', type=int, default=20, help="Number of parts in the job")
+    parser.add_argument('--upload', type=float, default=fake_genai.UPLOAD_SECONDS, help="Seconds per upload")
+    parser.add_argument('--generate', type=float, default=fake_genai.GENERATE_SECONDS, help="Seconds per generate call")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+    fake_genai.UPLOAD_SECONDS = args.upload
+    fake_genai.GENERATE_SECONDS = args.generate
+    pconvert.get_model_name = lambda: 'fake'
+    prompt = pconvert.get_prompt('text')
+
+    with tempfile.TemporaryDirectory() as folder:
+        pconvert.app.config['UPLOAD_FOLDER'] = folder
+
+        started = time.perf_counter()
+        serial_text = run_serial(make_parts(folder, args.parts), prompt)
+        serial_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        pipelined_text = run_pipelined(make_parts(folder, args.parts), prompt, 'bench')
+        pipelined_seconds = time.perf_counter() - started
+
+    if serial_text != pipelined_text:
+        print("Pipelined result differs from the serial result", file=sys.stderr)
+        return 1
+
+    print(f"{args.parts} parts, {args.upload}s upload + {args.generate}s generate per part")
+    print(f"Serial:    {serial_seconds:.2f}s")
+    print(f"Pipelined: {pipelined_seconds:.2f}s ({serial_seconds / pipelined_seconds:.2f}x faster)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
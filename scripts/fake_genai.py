@@ -0,0 +1,43 @@
+"""Local stand-in for google.generativeai with fixed upload/generate latency.
+
+Only covers the calls app.py makes, so conversions can be benchmarked
+without an API key or network access. install() must run before app is
+imported.
+"""
+import sys
+import time
+import types
+
+UPLOAD_SECONDS = 0.15
+GENERATE_SECONDS = 0.25
+
+
+def configure(api_key=None):
+    pass
+
+
+def upload_file(path, display_name=None):
+    time.sleep(UPLOAD_SECONDS)
+    return path
+
+
+class GenerateResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class GenerativeModel:
+    def __init__(self, model_name=None, generation_config=None):
+        self.model_name = model_name
+
+    def generate_content(self, contents):
+        time.sleep(GENERATE_SECONDS)
+        return GenerateResponse(f"Converted {contents[0]}: $x*y = √2$")
+
+
+def install():
+    """Register this module as google.generativeai"""
+    module = sys.modules[__name__]
+    google = sys.modules.setdefault('google', types.ModuleType('google'))
+    google.generativeai = module
+    sys.modules['google.generativeai'] = module